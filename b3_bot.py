@@ -1,6 +1,8 @@
+import os
 import time
 import traceback
-from typing import List, Dict, Any, Generator
+from contextlib import nullcontext
+from typing import List, Dict, Any, Generator, Optional
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -8,13 +10,27 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from b3_profiler import RunProfiler
+from b3_queue import split_batches
 
 SIMULADOR_URL = "https://simulador.b3.com.br/"
+# Use an installed chromedriver instead of downloading one (offline/CI/Docker)
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH")
+# Set an input's value the way typing would: go through the native setter (so
+# framework-controlled inputs notice) and fire input/change, then blur like TAB
+SET_INPUT_VALUE_JS = """
+const el = arguments[0];
+Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set.call(el, arguments[1]);
+el.dispatchEvent(new Event('input', {bubbles: true}));
+el.dispatchEvent(new Event('change', {bubbles: true}));
+el.blur();
+"""
 
 class B3SimulatorBot:
-    def __init__(self, headless: bool = True):
+    def __init__(self, headless: bool = True, profiler: Optional[RunProfiler] = None):
         self.headless = headless
         self.driver = None
+        self.profiler = profiler  # Opt-in run timeline (see b3_profiler)
 
     def start_driver(self):
         chrome_options = webdriver.ChromeOptions()
@@ -52,13 +68,35 @@ class B3SimulatorBot:
         chrome_options.add_argument("--hide-scrollbars")
         chrome_options.add_argument("--window-size=1920,1080")
         
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+        with self._span("start_driver", "setup"):
+            self.driver = webdriver.Chrome(service=Service(CHROMEDRIVER_PATH or ChromeDriverManager().install()), options=chrome_options)
+        if self.profiler:
+            self.profiler.instrument(self.driver)
 
     def close_driver(self):
         if self.driver:
             self.driver.quit()
             self.driver = None
 
+    def _span(self, name, cat, **args):
+        if self.profiler:
+            return self.profiler.span(name, cat, **args)
+        return nullcontext()
+
+    def _sleep(self, seconds):
+        with self._span("sleep", "sleep", seconds=seconds):
+            time.sleep(seconds)
+
+    def _wait(self, timeout, condition):
+        with self._span(getattr(condition, "__qualname__", "wait").split(".")[0], "wait", timeout=timeout):
+            return WebDriverWait(self.driver, timeout).until(condition)
+
+    def _mark(self, batch_idx, position=None):
+        # Tag subsequent profiler spans with the batch/position being processed
+        if self.profiler:
+            self.profiler.batch = batch_idx
+            self.profiler.position = position
+
     def _positive_int(self, val):
         """Convert value to positive integer (assumes sign already handled)"""
         try:
@@ -72,69 +110,57 @@ class B3SimulatorBot:
     def _selecionar_opcao_sobre_acao(self):
         xp = "//label[contains(., 'Opção sobre Ação')]"
         try:
-            elem = WebDriverWait(self.driver, 8).until(
-                EC.element_to_be_clickable((By.XPATH, xp))
-            )
+            elem = self._wait(8, EC.element_to_be_clickable((By.XPATH, xp)))
             self.driver.execute_script("arguments[0].click();", elem)
-            time.sleep(0.2)
+            self._sleep(0.2)
         except Exception as e:
             # Maybe it's already selected or different layout, log warning but continue
             pass
 
     def _preencher_codigo(self, ativo):
-        caixa = WebDriverWait(self.driver, 8).until(
-            EC.element_to_be_clickable((By.XPATH, '//*[@id="symbolSelect"]/div'))
-        )
+        caixa = self._wait(8, EC.element_to_be_clickable((By.XPATH, '//*[@id="symbolSelect"]/div')))
         caixa.click()
-        time.sleep(0.5)
+        self._sleep(0.5)
         input_real = caixa.find_element(By.TAG_NAME, "input")
         input_real.clear()
         input_real.send_keys(ativo)
-        time.sleep(0.5)
+        self._sleep(0.5)
         input_real.send_keys(Keys.ENTER)
-        time.sleep(0.8)
+        self._sleep(0.8)
 
     def _preencher_quantidade_compra(self, qtd):
-        time.sleep(0.5)
+        self._sleep(0.5)
         try:
-            campo = WebDriverWait(self.driver, 8).until(
-                EC.presence_of_element_located((By.XPATH, '//*[@id="qtd_buy"]'))
-            )
+            campo = self._wait(8, EC.presence_of_element_located((By.XPATH, '//*[@id="qtd_buy"]')))
             # Try JavaScript first (more reliable in server environments)
-            self.driver.execute_script("arguments[0].value = arguments[1];", campo, str(qtd))
-            time.sleep(0.3)
+            self.driver.execute_script(SET_INPUT_VALUE_JS, campo, str(qtd))
+            self._sleep(0.3)
         except Exception as e:
             # Fallback to normal method
-            campo = WebDriverWait(self.driver, 8).until(
-                EC.element_to_be_clickable((By.XPATH, '//*[@id="qtd_buy"]'))
-            )
+            campo = self._wait(8, EC.element_to_be_clickable((By.XPATH, '//*[@id="qtd_buy"]')))
             campo.click()
-            time.sleep(0.2)
+            self._sleep(0.2)
             campo.clear()
             campo.send_keys(str(qtd))
-            time.sleep(0.2)
+            self._sleep(0.2)
 
     def _preencher_quantidade_venda(self, qtd):
-        time.sleep(0.5)
+        self._sleep(0.5)
         try:
-            div = WebDriverWait(self.driver, 8).until(
-                EC.presence_of_element_located((By.XPATH, '//*[@id="divQtdSell"]'))
-            )
+            div = self._wait(8, EC.presence_of_element_located((By.XPATH, '//*[@id="divQtdSell"]')))
             input_real = div.find_element(By.TAG_NAME, "input")
             # Try JavaScript first (more reliable in server environments)
-            self.driver.execute_script("arguments[0].value = arguments[1];", input_real, str(qtd))
-            time.sleep(0.3)
+            self.driver.execute_script(SET_INPUT_VALUE_JS, input_real, str(qtd))
+            self._sleep(0.3)
         except Exception as e:
             # Fallback to normal method
-            div = WebDriverWait(self.driver, 8).until(
-                EC.element_to_be_clickable((By.XPATH, '//*[@id="divQtdSell"]'))
-            )
+            div = self._wait(8, EC.element_to_be_clickable((By.XPATH, '//*[@id="divQtdSell"]')))
             input_real = div.find_element(By.TAG_NAME, "input")
             input_real.click()
-            time.sleep(0.2)
+            self._sleep(0.2)
             input_real.clear()
             input_real.send_keys(str(qtd))
-            time.sleep(0.2)
+            self._sleep(0.2)
 
     def _clicar_adicionar(self):
         xpaths = [
@@ -145,13 +171,11 @@ class B3SimulatorBot:
         ]
         for xp in xpaths:
             try:
-                btn = WebDriverWait(self.driver, 5).until(
-                    EC.element_to_be_clickable((By.XPATH, xp))
-                )
+                btn = self._wait(5, EC.element_to_be_clickable((By.XPATH, xp)))
                 self.driver.execute_script("arguments[0].scrollIntoView(true);", btn)
-                time.sleep(0.2)
+                self._sleep(0.2)
                 self.driver.execute_script("arguments[0].click();", btn)
-                time.sleep(0.5)
+                self._sleep(0.5)
                 return True
             except:
                 continue
@@ -159,7 +183,6 @@ class B3SimulatorBot:
 
     def _clicar_calcular(self):
         try:
-            wait = WebDriverWait(self.driver, 5)
             xpaths = [
                 "//button[contains(., 'CALCULAR')]",
                 "//button[contains(., 'Calcular')]",
@@ -168,15 +191,15 @@ class B3SimulatorBot:
             btn = None
             for xp in xpaths:
                 try:
-                    btn = wait.until(EC.element_to_be_clickable((By.XPATH, xp)))
+                    btn = self._wait(5, EC.element_to_be_clickable((By.XPATH, xp)))
                     break
                 except:
                     continue
             if btn:
                 self.driver.execute_script("arguments[0].scrollIntoView(true);", btn)
-                time.sleep(0.2)
+                self._sleep(0.2)
                 self.driver.execute_script("arguments[0].click();", btn)
-                time.sleep(1.5)
+                self._sleep(1.5)
                 return True
             else:
                 return False
@@ -186,9 +209,7 @@ class B3SimulatorBot:
     def _capturar_resultado(self):
         try:
             xp_resultado = "//*[contains(text(), 'Risco das Posições')]/following-sibling::*"
-            elem = WebDriverWait(self.driver, 5).until(
-                EC.visibility_of_element_located((By.XPATH, xp_resultado))
-            )
+            elem = self._wait(5, EC.visibility_of_element_located((By.XPATH, xp_resultado)))
             texto = elem.text.strip()
             texto_limpo = texto.replace("R$", "").replace(" ", "").replace(".", "").replace(",", ".")
             if not texto_limpo or texto_limpo == "-":
@@ -207,79 +228,112 @@ class B3SimulatorBot:
         except:
             pass
 
+    def process_batch(self, batch: List[Dict[str, Any]], batch_idx: int, total_batches: int) -> Generator[Dict[str, Any], None, Optional[float]]:
+        """
+        Generator that yields log/progress events for one batch.
+        Returns the batch risk, or None if the batch failed (driver must already be started).
+        """
+        yield {"type": "log", "message": f"Processando lote {batch_idx + 1}/{total_batches}...", "level": "info"}
+        self._mark(batch_idx)
+
+        try:
+            with self._span("carregar_pagina", "step"):
+                self.driver.get(SIMULADOR_URL)
+                self._sleep(1.5) # Wait for load
+                self._close_modals()
+
+                self._selecionar_opcao_sobre_acao()
+
+            for pos in batch:
+                ativo = pos['asset'].strip()
+                qtd = self._positive_int(pos['quantity'])
+                tipo = pos.get('type', 'Compra') # Default to Compra if missing
+
+                yield {"type": "log", "message": f"Adicionando: {ativo} ({tipo} {qtd})", "level": "debug"}
+                self._mark(batch_idx, ativo)
+
+                # Events are yielded after the span so consumer time isn't charged to the ticker
+                error = None
+                added = False
+                with self._span(ativo, "position", type=tipo, quantity=qtd):
+                    try:
+                        with self._span("preencher_codigo", "step"):
+                            self._preencher_codigo(ativo)
+
+                        with self._span("preencher_quantidades", "step"):
+                            if tipo == "Compra":
+                                self._preencher_quantidade_compra(qtd)
+                                self._preencher_quantidade_venda(0)
+                            else:
+                                self._preencher_quantidade_venda(qtd)
+                                self._preencher_quantidade_compra(0)
+
+                        with self._span("clicar_adicionar", "step"):
+                            added = self._clicar_adicionar()
+                    except Exception as e:
+                        error = e
+
+                    self._sleep(0.2)
+
+                if error is not None:
+                    yield {"type": "log", "message": f"Erro ao adicionar {ativo}: {str(error)}", "level": "warning"}
+                elif added:
+                    yield {"type": "progress", "value": 1}
+                else:
+                    yield {"type": "log", "message": f"Falha ao adicionar {ativo}", "level": "warning"}
+
+            self._mark(batch_idx)
+            yield {"type": "log", "message": "Calculando risco do lote...", "level": "info"}
+            with self._span("clicar_calcular", "step"):
+                self._clicar_calcular()
+
+            with self._span("capturar_resultado", "step"):
+                risk = self._capturar_resultado()
+            yield {"type": "log", "message": f"Risco do lote {batch_idx + 1}: R$ {risk:,.2f}", "level": "success"}
+            return risk
+
+        except Exception as e:
+            yield {"type": "error", "batch": batch_idx + 1, "message": f"Erro no lote {batch_idx + 1}: {str(e)}"}
+            traceback.print_exc()
+            return None
+        finally:
+            self._mark(None)
+
     def process_simulation(self, positions: List[Dict[str, Any]]) -> Generator[Dict[str, Any], None, None]:
         """
         Generator that yields log messages and final result.
         positions: List of dicts with 'asset', 'quantity', 'type'
         """
+        started = time.monotonic()
         try:
             yield {"type": "log", "message": "Iniciando driver do Chrome...", "level": "info"}
             self.start_driver()
             
-            total_batches = (len(positions) + 19) // 20
+            batches = split_batches(positions)
+            total_batches = len(batches)
             yield {"type": "log", "message": f"Total de posições: {len(positions)}. Lotes: {total_batches}", "level": "info"}
             
             accumulated_risk = 0.0
             
-            for batch_idx in range(total_batches):
-                start_idx = batch_idx * 20
-                end_idx = min((batch_idx + 1) * 20, len(positions))
-                batch = positions[start_idx:end_idx]
-                
-                yield {"type": "log", "message": f"Processando lote {batch_idx + 1}/{total_batches}...", "level": "info"}
-                
-                try:
-                    self.driver.get(SIMULADOR_URL)
-                    time.sleep(1.5) # Wait for load
-                    self._close_modals()
-                    
-                    self._selecionar_opcao_sobre_acao()
-                    
-                    for pos in batch:
-                        ativo = pos['asset'].strip()
-                        qtd = self._positive_int(pos['quantity'])
-                        tipo = pos.get('type', 'Compra') # Default to Compra if missing
-                        
-                        yield {"type": "log", "message": f"Adicionando: {ativo} ({tipo} {qtd})", "level": "info"}
-                        
-                        try:
-                            self._preencher_codigo(ativo)
-                            
-                            if tipo == "Compra":
-                                self._preencher_quantidade_compra(qtd)
-                                self._preencher_quantidade_venda(0)
-                            else:
-                                self._preencher_quantidade_venda(qtd)
-                                self._preencher_quantidade_compra(0)
-                                
-                            if self._clicar_adicionar():
-                                yield {"type": "progress", "value": 1}
-                            else:
-                                yield {"type": "log", "message": f"Falha ao adicionar {ativo}", "level": "warning"}
-                        except Exception as e:
-                             yield {"type": "log", "message": f"Erro ao adicionar {ativo}: {str(e)}", "level": "warning"}
-                        
-                        time.sleep(0.2)
-                    
-                    yield {"type": "log", "message": "Calculando risco do lote...", "level": "info"}
-                    self._clicar_calcular()
-                    
-                    risk = self._capturar_resultado()
-                    accumulated_risk += risk
-                    yield {"type": "log", "message": f"Risco do lote {batch_idx + 1}: R$ {risk:,.2f}", "level": "success"}
-                    
-                except Exception as e:
-                    yield {"type": "log", "message": f"Erro no lote {batch_idx + 1}: {str(e)}", "level": "error"}
-                    traceback.print_exc()
+            for batch_idx, batch in enumerate(batches):
+                risk = yield from self.process_batch(batch, batch_idx, total_batches)
+                accumulated_risk += risk or 0.0
 
             result_data = {
                 "risk": accumulated_risk,
+                "guarantees": 0, # Not captured in script
+                "balance": 0,    # Not captured in script
+                "calculationTime": f"{time.monotonic() - started:.1f}s",
                 "date": time.strftime("%d/%m/%Y %H:%M:%S")
             }
             yield {"type": "result", "data": result_data}
             yield {"type": "log", "message": "Simulação finalizada com sucesso.", "level": "success"}
 
         except Exception as e:
-            yield {"type": "log", "message": f"Erro fatal: {str(e)}", "level": "error"}
+            yield {"type": "error", "batch": None, "message": f"Erro fatal: {str(e)}"}
         finally:
             self.close_driver()
+
+        # Also after a fatal error: that is when the timeline matters most
+        if self.profiler:
+            yield {"type": "profile", "data": self.profiler.summary()}
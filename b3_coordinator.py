@@ -0,0 +1,89 @@
+import time
+from typing import List, Dict, Any, Optional
+from b3_queue import BatchQueue, split_batches, DEFAULT_QUEUE_PATH, DEFAULT_LEASE_SECONDS, DEFAULT_RUN_TTL
+
+# Give up after this long with no worker events and no batch finishing (e.g. no
+# worker running). Always kept above the longest lease a worker took for the run
+# (times IDLE_LEASE_FACTOR) so a crashed worker's batch can still be re-leased.
+IDLE_LEASE_FACTOR = 2.5
+DEFAULT_IDLE_TIMEOUT = DEFAULT_LEASE_SECONDS * IDLE_LEASE_FACTOR
+
+
+def process_simulation_distributed(positions: List[Dict[str, Any]], queue_path: str = DEFAULT_QUEUE_PATH,
+                                   poll_interval: float = 0.5, idle_timeout: Optional[float] = None,
+                                   run_ttl: float = DEFAULT_RUN_TTL, max_attempts: Optional[int] = None):
+    """
+    Coordinator: split positions into batches, let the b3_worker.py processes run
+    them, stream their events back and sum the batch risks into the final result.
+    """
+    run_id = None
+    queue = None
+    started = time.monotonic()
+    idle_limit = idle_timeout if idle_timeout is not None else DEFAULT_IDLE_TIMEOUT
+    try:
+        queue = BatchQueue(queue_path) if max_attempts is None else BatchQueue(queue_path, max_attempts)
+        batches = split_batches(positions)
+        run_id = queue.enqueue_run(batches, run_ttl)
+        yield {"type": "log", "message": f"Total de posições: {len(positions)}. Lotes: {len(batches)} (distribuídos)", "level": "info"}
+
+        last_seq = 0
+        batch_owner = {}
+        reported_failed = set()
+        last_activity = time.monotonic()
+        last_touch = time.monotonic()
+        while True:
+            for seq, event in queue.read_events(run_id, last_seq):
+                last_seq = seq
+                last_activity = time.monotonic()
+                batch_idx, worker = event.get("batch_idx"), event.get("worker")
+                if batch_idx in batch_owner and batch_owner[batch_idx] != worker:
+                    yield {"type": "log", "message": f"Lote {batch_idx + 1} redistribuído para {worker}", "level": "warning"}
+                batch_owner[batch_idx] = worker
+                yield event
+
+            if time.monotonic() - last_touch > run_ttl / 4:
+                queue.touch_run(run_id, run_ttl)
+                last_touch = time.monotonic()
+
+            queue.fail_expired()
+            jobs = queue.run_status(run_id)
+            for job in jobs:
+                if job["status"] == "failed" and job["batch_idx"] not in reported_failed:
+                    reported_failed.add(job["batch_idx"])
+                    last_activity = time.monotonic()
+                    yield {"type": "error", "batch": job["batch_idx"] + 1, "message": f"Lote {job['batch_idx'] + 1} falhou após {job['attempts']} tentativas"}
+
+            if all(job["status"] in ("done", "failed") for job in jobs):
+                break
+
+            longest_lease = max((job["lease_seconds"] or 0.0 for job in jobs), default=0.0)
+            limit = max(idle_limit, longest_lease * IDLE_LEASE_FACTOR)
+            if time.monotonic() - last_activity > limit:
+                pending = sum(1 for job in jobs if job["status"] not in ("done", "failed"))
+                yield {"type": "error", "batch": None, "message": f"Tempo esgotado: nenhum worker progrediu em {limit:.0f}s ({pending} lotes pendentes)"}
+                return
+            time.sleep(poll_interval)
+
+        # Pick up anything published between the last read and completion
+        for seq, event in queue.read_events(run_id, last_seq):
+            yield event
+
+        accumulated_risk = sum(job["result"]["risk"] for job in jobs if job["status"] == "done")
+        result_data = {
+            "risk": accumulated_risk,
+            "failedBatches": len(reported_failed),
+            "guarantees": 0, # Not captured in script
+            "balance": 0,    # Not captured in script
+            "calculationTime": f"{time.monotonic() - started:.1f}s",
+            "date": time.strftime("%d/%m/%Y %H:%M:%S")
+        }
+        yield {"type": "result", "data": result_data}
+        yield {"type": "log", "message": "Simulação finalizada com sucesso.", "level": "success"}
+
+    except Exception as e:
+        yield {"type": "error", "batch": None, "message": f"Erro fatal: {str(e)}"}
+    finally:
+        # Also runs when the client disconnects: workers drop the run's remaining batches.
+        # If the coordinator is killed instead, the run expires after run_ttl.
+        if queue and run_id:
+            queue.purge_run(run_id)
@@ -0,0 +1,125 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+class RunProfiler:
+    """
+    Opt-in timeline of a simulation run: every WebDriver command, wait, sleep
+    and page load, tagged with the batch and position it belongs to.
+    Export with to_chrome_trace() and open in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.batch: Optional[int] = None
+        self.position: Optional[str] = None
+
+    @contextmanager
+    def span(self, name: str, cat: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({
+                "name": name,
+                "cat": cat,
+                "start": start - self.origin,
+                "end": time.perf_counter() - self.origin,
+                "batch": self.batch,
+                "position": self.position,
+                "args": args
+            })
+
+    def instrument(self, driver):
+        """Time every command the driver (and its elements) sends to chromedriver"""
+        execute = driver.execute
+
+        def timed_execute(driver_command, params=None):
+            cat = "page_load" if driver_command == "get" else "webdriver"
+            with self.span(driver_command, cat):
+                return execute(driver_command, params)
+
+        driver.execute = timed_execute
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        # One track per batch; setup/teardown outside any batch goes on track 0
+        events = []
+        for s in self.spans:
+            args = dict(s["args"])
+            if s["batch"] is not None:
+                args["batch"] = s["batch"] + 1
+            if s["position"] is not None:
+                args["position"] = s["position"]
+            events.append({
+                "name": s["name"],
+                "cat": s["cat"],
+                "ph": "X",
+                "ts": round(s["start"] * 1e6),
+                "dur": round((s["end"] - s["start"]) * 1e6),
+                "pid": 1,
+                "tid": 0 if s["batch"] is None else s["batch"] + 1,
+                "args": args
+            })
+        tracks = {e["tid"] for e in events}
+        for tid in sorted(tracks):
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                "args": {"name": "Setup" if tid == 0 else f"Lote {tid}"}
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self) -> str:
+        return json.dumps(self.to_chrome_trace())
+
+    def summary(self, top: int = 5) -> Dict[str, Any]:
+        """
+        Slowest tickers (whole-position time), steps (total time per step name)
+        and operations. Operations are the innermost sleeps, waits, page loads and
+        WebDriver commands; commands issued while polling inside a wait count as
+        part of that wait. None of them overlap, so no time is counted twice.
+        """
+        tickers = sorted(
+            (
+                {"ticker": s["name"], "batch": s["batch"] + 1, "seconds": round(s["end"] - s["start"], 3)}
+                for s in self.spans if s["cat"] == "position"
+            ),
+            key=lambda row: row["seconds"],
+            reverse=True
+        )
+
+        steps = [s for s in self.spans if s["cat"] == "step"]
+        operations = []
+        open_spans = []  # Enclosing spans of the current one
+        for s in sorted(self.spans, key=lambda s: (s["start"], -s["end"])):
+            while open_spans and open_spans[-1]["end"] <= s["start"]:
+                open_spans.pop()
+            in_wait = any(parent["cat"] == "wait" for parent in open_spans)
+            if s["cat"] in ("sleep", "wait", "page_load", "setup") or (s["cat"] == "webdriver" and not in_wait):
+                operations.append(s)
+            open_spans.append(s)
+
+        total = max((s["end"] for s in self.spans), default=0.0)
+        return {
+            "total_seconds": round(total, 3),
+            "slowest_tickers": tickers[:top],
+            "slowest_steps": self._rank(steps, "step", top),
+            "slowest_operations": self._rank(operations, "operation", top)
+        }
+
+    @staticmethod
+    def _rank(spans: List[Dict[str, Any]], label: str, top: int) -> List[Dict[str, Any]]:
+        rows: Dict[str, Dict[str, Any]] = {}
+        for s in spans:
+            key = f"{s['cat']}:{s['name']}"
+            row = rows.setdefault(key, {label: key, "count": 0, "seconds": 0.0, "max": 0.0})
+            duration = s["end"] - s["start"]
+            row["count"] += 1
+            row["seconds"] += duration
+            row["max"] = max(row["max"], duration)
+        for row in rows.values():
+            row["seconds"] = round(row["seconds"], 3)
+            row["max"] = round(row["max"], 3)
+        return sorted(rows.values(), key=lambda row: row["seconds"], reverse=True)[:top]
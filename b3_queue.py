@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+
+# Shared by the coordinator (server.py) and every worker (b3_worker.py).
+# Point all of them at the same file on a filesystem with working POSIX locks
+# (local disk, or NFSv4 with locking enabled; not SMB/CIFS or lock-less mounts).
+DEFAULT_QUEUE_PATH = os.environ.get("B3_QUEUE_PATH", "b3_queue.db")
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3  # Leases a batch may burn (crashes/OOM kills) before it is marked failed
+DEFAULT_RUN_TTL = 60.0  # A run whose coordinator stops touching it for this long is purged
+BATCH_SIZE = 20  # Positions per simulator page load
+_FAILED_RESULT = json.dumps({"risk": 0.0, "ok": False})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    batch_idx INTEGER NOT NULL,
+    total_batches INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_seconds REAL,
+    run_expires REAL,
+    result TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_run_idx ON jobs (run_id);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_run_idx ON events (run_id, seq);
+"""
+
+# Columns added after the first release; ALTERed into older queue files
+_ADDED_COLUMNS = {"lease_seconds": "REAL", "run_expires": "REAL"}
+
+
+def split_batches(positions: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split positions into the batches submitted to the simulator in a single page load"""
+    return [positions[i:i + BATCH_SIZE] for i in range(0, len(positions), BATCH_SIZE)]
+
+
+class BatchQueue:
+    """
+    SQLite-backed batch queue with leases.
+    A worker claims a job for lease_seconds and must heartbeat to keep it;
+    if it crashes, the lease expires and the job is handed out again,
+    up to max_attempts times before it is marked failed.
+    The coordinator likewise keeps its run alive with touch_run; runs it
+    abandoned (killed coordinator) are purged instead of being worked on.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            # Rollback journal, not WAL: WAL needs shared memory between all
+            # processes and breaks when workers on other hosts share the file
+            conn.execute("PRAGMA journal_mode=DELETE")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # Coordinator side
+
+    def enqueue_run(self, batches: List[List[Dict[str, Any]]], run_ttl: float = DEFAULT_RUN_TTL) -> str:
+        """Enqueue every batch of a run and return its run_id"""
+        run_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (id, run_id, batch_idx, total_batches, payload, run_expires, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (uuid.uuid4().hex, run_id, batch_idx, len(batches), json.dumps(batch), now + run_ttl, now)
+                    for batch_idx, batch in enumerate(batches)
+                ]
+            )
+        return run_id
+
+    def touch_run(self, run_id: str, run_ttl: float = DEFAULT_RUN_TTL):
+        """Coordinator heartbeat: keep the run from being purged as abandoned"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET run_expires = ? WHERE run_id = ?", (time.time() + run_ttl, run_id))
+
+    def read_events(self, run_id: str, after_seq: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, payload FROM events WHERE run_id = ? AND seq > ? ORDER BY seq",
+                (run_id, after_seq)
+            ).fetchall()
+        return [(row["seq"], json.loads(row["payload"])) for row in rows]
+
+    def run_status(self, run_id: str) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT batch_idx, status, worker_id, attempts, lease_seconds, result FROM jobs WHERE run_id = ? ORDER BY batch_idx",
+                (run_id,)
+            ).fetchall()
+        return [
+            {
+                "batch_idx": row["batch_idx"],
+                "status": row["status"],
+                "worker_id": row["worker_id"],
+                "attempts": row["attempts"],
+                "lease_seconds": row["lease_seconds"],
+                "result": json.loads(row["result"]) if row["result"] else None
+            }
+            for row in rows
+        ]
+
+    def fail_expired(self) -> int:
+        """Mark jobs that used up max_attempts (and are not running) as failed. Returns how many."""
+        with self._transaction() as conn:
+            return self._fail_expired(conn, time.time())
+
+    def _fail_expired(self, conn, now: float) -> int:
+        cur = conn.execute(
+            "UPDATE jobs SET status = 'failed', result = ?, worker_id = NULL, lease_expires = NULL "
+            "WHERE attempts >= ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))",
+            (_FAILED_RESULT, self.max_attempts, now)
+        )
+        return cur.rowcount
+
+    def _purge_abandoned(self, conn, now: float):
+        abandoned = "SELECT DISTINCT run_id FROM jobs WHERE run_expires < ?"
+        conn.execute(f"DELETE FROM events WHERE run_id IN ({abandoned})", (now,))
+        conn.execute(f"DELETE FROM jobs WHERE run_id IN ({abandoned})", (now,))
+
+    def purge_run(self, run_id: str):
+        """Drop a run's jobs and events; workers still holding one of its jobs are ignored on completion"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM events WHERE run_id = ?", (run_id,))
+
+    # Worker side
+
+    def claim(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Lease the oldest pending job (or one whose lease expired). Returns None if the queue is empty."""
+        now = time.time()
+        with self._transaction() as conn:
+            self._purge_abandoned(conn, now)
+            self._fail_expired(conn, now)
+            row = conn.execute(
+                "SELECT id, run_id, batch_idx, total_batches, payload FROM jobs "
+                "WHERE attempts < ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY created_at, batch_idx LIMIT 1",
+                (self.max_attempts, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker_id = ?, lease_expires = ?, lease_seconds = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now + lease_seconds, lease_seconds, row["id"])
+            )
+        return {
+            "id": row["id"],
+            "run_id": row["run_id"],
+            "batch_idx": row["batch_idx"],
+            "total_batches": row["total_batches"],
+            "positions": json.loads(row["payload"])
+        }
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend the lease. Returns False if the job was re-leased to someone else or purged."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + lease_seconds, job_id, worker_id)
+            )
+        return cur.rowcount == 1
+
+    def publish_event(self, job_id: str, worker_id: str, event: Dict[str, Any]) -> bool:
+        """Append an event to the job's run stream, only while the worker still owns the job"""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO events (run_id, payload) "
+                "SELECT run_id, ? FROM jobs WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (json.dumps(event), job_id, worker_id)
+            )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (json.dumps(result), job_id, worker_id)
+            )
+        return cur.rowcount == 1
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """
+        Hand a job back immediately (worker leaving mid-batch or failing to run it)
+        instead of waiting for the lease to expire. A job that used up max_attempts
+        is marked failed rather than returned to the queue.
+        """
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "result = CASE WHEN attempts >= ? THEN ? ELSE NULL END, "
+                "worker_id = NULL, lease_expires = NULL "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (self.max_attempts, self.max_attempts, _FAILED_RESULT, job_id, worker_id)
+            )
+        return cur.rowcount == 1
@@ -0,0 +1,82 @@
+import json
+import time
+import zlib
+from typing import Dict, Any, Iterable, Iterator
+
+try:
+    import msgpack
+except ImportError:  # Optional: only needed for format="msgpack"
+    msgpack = None
+
+# Log levels in increasing order of importance; "success" ranks with "info"
+LEVELS = {"debug": 0, "info": 1, "success": 1, "warning": 2, "error": 3}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "msgpack": "application/x-msgpack",
+}
+
+
+def filter_events(events: Iterable[Dict[str, Any]], verbosity: str = "debug",
+                  progress_window: float = 30.0, structured_errors: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Drop log events below the requested verbosity and merge progress events
+    into one aggregate count per progress_window seconds (the window opens at
+    the first unsent progress event; log events don't close it).
+    verbosity="info" drops the per-position "Adicionando" logs.
+    Anything that is not a log or progress event (result, error, profile) is
+    always passed through, after any pending progress.
+    With structured_errors=False, error events are sent in the original
+    {"type": "log", "level": "error"} form for clients that only render logs.
+    """
+    min_level = LEVELS.get(verbosity, 0)
+    pending = 0
+    window_start = 0.0
+
+    for event in events:
+        if event.get("type") == "error" and not structured_errors:
+            event = {"type": "log", "message": event["message"], "level": "error"}
+
+        if event.get("type") == "progress":
+            if not pending:
+                window_start = time.monotonic()
+            pending += event.get("value", 1)
+        elif event.get("type") == "log":
+            if LEVELS.get(event.get("level"), 0) >= min_level:
+                yield event
+        else:
+            # Results and errors must not overtake the progress they follow
+            if pending:
+                yield {"type": "progress", "value": pending}
+                pending = 0
+            yield event
+            continue
+
+        if pending and time.monotonic() - window_start >= progress_window:
+            yield {"type": "progress", "value": pending}
+            pending = 0
+
+    if pending:
+        yield {"type": "progress", "value": pending}
+
+
+def encode_events(events: Iterable[Dict[str, Any]], fmt: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """Frame events as compact NDJSON or a MessagePack stream, optionally gzip-compressed"""
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack não está instalado")
+        packer = msgpack.Packer()
+        encode = packer.pack
+    else:
+        encode = lambda event: (json.dumps(event, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+    if not compress:
+        for event in events:
+            yield encode(event)
+        return
+
+    # gzip container; sync-flush per event so the client sees it immediately
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for event in events:
+        yield gz.compress(encode(event)) + gz.flush(zlib.Z_SYNC_FLUSH)
+    yield gz.flush()
@@ -0,0 +1,106 @@
+import os
+import time
+import uuid
+import signal
+import socket
+import argparse
+import traceback
+from b3_queue import BatchQueue, DEFAULT_QUEUE_PATH, DEFAULT_LEASE_SECONDS
+
+
+class BatchWorker:
+    """
+    Pulls batch jobs from the shared queue and runs them on one long-lived browser.
+    Start as many as the node can hold; they can join or leave at any time.
+    bot is a B3SimulatorBot (anything with start_driver/close_driver/process_batch).
+    """
+
+    def __init__(self, queue: BatchQueue, bot,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = 1.0,
+                 idle_exit: float = 0):
+        self.queue = queue
+        self.bot = bot
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.idle_exit = idle_exit  # Seconds without work before exiting (0 = never)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.stopping = False
+
+    def stop(self, *_):
+        # Finish the current batch, then leave
+        self.stopping = True
+
+    def run_job(self, job):
+        job_id = job["id"]
+        gen = self.bot.process_batch(job["positions"], job["batch_idx"], job["total_batches"])
+        try:
+            while True:
+                event = next(gen)
+                event["worker"] = self.worker_id
+                event["batch_idx"] = job["batch_idx"]  # 0-based; "batch" (1-based) is the event's own field
+                if not self.queue.publish_event(job_id, self.worker_id, event):
+                    # Lease lost (expired and re-leased, or run cancelled): drop the batch
+                    gen.close()
+                    return
+                self.queue.heartbeat(job_id, self.worker_id, self.lease_seconds)
+        except StopIteration as stop:
+            risk = stop.value
+
+        self.queue.complete(job_id, self.worker_id, {"risk": risk or 0.0, "ok": risk is not None})
+        if risk is None:
+            # Browser may be wedged; start a fresh one for the next job
+            self.bot.close_driver()
+
+    def run(self):
+        print(f"[{self.worker_id}] Aguardando lotes em {self.queue.path}...")
+        idle_since = time.time()
+        try:
+            while not self.stopping:
+                job = self.queue.claim(self.worker_id, self.lease_seconds)
+                if job is None:
+                    if self.idle_exit and time.time() - idle_since > self.idle_exit:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                print(f"[{self.worker_id}] Lote {job['batch_idx'] + 1}/{job['total_batches']} (run {job['run_id'][:8]})")
+                try:
+                    if self.bot.driver is None:
+                        self.bot.start_driver()
+                    self.run_job(job)
+                except KeyboardInterrupt:
+                    # Give the batch back right away rather than waiting for the lease
+                    self.queue.release(job["id"], self.worker_id)
+                    raise
+                except Exception:
+                    self.queue.release(job["id"], self.worker_id)
+                    self.bot.close_driver()
+                    traceback.print_exc()
+                    time.sleep(self.poll_interval)
+                idle_since = time.time()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.bot.close_driver()
+            print(f"[{self.worker_id}] Encerrado.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de lotes do Simulador de Margem B3")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Caminho do arquivo SQLite da fila compartilhada")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Segundos até um lote de um worker parado ser redistribuído")
+    parser.add_argument("--poll", type=float, default=1.0, help="Intervalo de consulta da fila (s)")
+    parser.add_argument("--idle-exit", type=float, default=0, help="Encerrar após N segundos sem lotes (0 = nunca)")
+    parser.add_argument("--headed", action="store_true", help="Exibir o navegador")
+    args = parser.parse_args()
+
+    # Imported here so the worker loop itself has no Selenium dependency
+    from b3_bot import B3SimulatorBot
+    worker = BatchWorker(BatchQueue(args.queue), B3SimulatorBot(headless=not args.headed),
+                         lease_seconds=args.lease, poll_interval=args.poll, idle_exit=args.idle_exit)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
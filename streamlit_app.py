@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import time
 from b3_bot import B3SimulatorBot
+from b3_profiler import RunProfiler
 
 st.set_page_config(
     page_title="Simulador de Margem B3",
@@ -53,6 +54,7 @@ with st.sidebar:
     - Sempre verifique os valores diretamente no site da B3
     """)
     st.info("💡 O navegador executa em modo invisível para melhor performance.")
+    profiling_mode = st.checkbox("🔬 Modo de profiling", help="Registra a linha do tempo de cada comando, espera e carregamento de página")
 
 # Always use headless mode
 headless_mode = True
@@ -149,7 +151,8 @@ if st.button("🚀 Iniciar Simulação", type="primary"):
         st.warning("Nenhuma posição para processar. Adicione itens na tabela manual ou faça upload de uma planilha.")
     else:
         # Run Simulation
-        bot = B3SimulatorBot(headless=headless_mode)
+        profiler = RunProfiler() if profiling_mode else None
+        bot = B3SimulatorBot(headless=headless_mode, profiler=profiler)
         
         progress_bar = st.progress(0)
         status_area = st.empty()
@@ -165,21 +168,21 @@ if st.button("🚀 Iniciar Simulação", type="primary"):
         
         try:
             for event in bot.process_simulation(final_positions):
-                if event["type"] == "log":
+                if event["type"] in ("log", "error"):
                     msg = f"[{time.strftime('%H:%M:%S')}] {event['message']}"
                     logs.append(msg)
                     # Keep only last 10 logs to avoid clutter or show all in expander
                     log_text.text_area("Log Output", "\n".join(logs[::-1]), height=200)
                     
                     # Update status banner
-                    if event["level"] == "info":
+                    if event["type"] == "error":
+                        status_area.error(event["message"])
+                    elif event["level"] in ("info", "debug"):
                         status_area.info(event["message"])
                     elif event["level"] == "success":
                         status_area.success(event["message"])
                     elif event["level"] == "warning":
                         status_area.warning(event["message"])
-                    elif event["level"] == "error":
-                        status_area.error(event["message"])
                         
                 elif event["type"] == "progress":
                     current_step += event["value"]
@@ -195,7 +198,30 @@ if st.button("🚀 Iniciar Simulação", type="primary"):
                         st.metric("Risco Total Estimado", f"R$ {res['risk']:,.2f}")
                     with col2:
                         st.metric("Data da Simulação", res["date"])
+
+                elif event["type"] == "profile":
+                    prof = event["data"]
+                    st.markdown(f"### Profiling ({prof['total_seconds']:.1f}s)")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.markdown("**Ativos mais lentos**")
+                        st.dataframe(pd.DataFrame(prof["slowest_tickers"]), use_container_width=True)
+                    with col2:
+                        st.markdown("**Etapas mais lentas**")
+                        st.dataframe(pd.DataFrame(prof["slowest_steps"]), use_container_width=True)
+                    with col3:
+                        st.markdown("**Operações mais lentas**")
+                        st.dataframe(pd.DataFrame(prof["slowest_operations"]), use_container_width=True)
                         
         except Exception as e:
             st.error(f"Ocorreu um erro inesperado: {e}")
 
+        # Offered whatever way the run ended, including "Erro fatal"
+        if profiler is not None and profiler.spans:
+            st.download_button(
+                "⬇️ Baixar trace (chrome://tracing)",
+                profiler.export_chrome_trace(),
+                file_name=f"b3_trace_{time.strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
+
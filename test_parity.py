@@ -0,0 +1,207 @@
+"""
+Parity between the Streamlit engine (B3SimulatorBot) and the FastAPI path (server.py).
+
+test_front_ends_share_engine_config runs without a browser: webdriver.Chrome is
+replaced by a fake driver and both front ends must launch Chrome with the same
+tuned options and perform the same waits and sleeps.
+
+test_front_ends_match drives real Chrome against an offline stand-in page. It uses
+CHROMEDRIVER_PATH (or chromedriver on PATH) so no driver download is needed, and
+is skipped with the reason when neither Chrome nor chromedriver is installed.
+"""
+import os
+import time
+import shutil
+import statistics
+import pytest
+
+pytest.importorskip("selenium")
+pytest.importorskip("fastapi")
+
+import b3_bot
+import server
+from b3_bot import B3SimulatorBot
+
+# Margin per unit in the stand-in page (sells cost more than buys)
+BUY_RATE = 1.5
+SELL_RATE = 2.5
+
+STAND_IN_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Simulador B3 (stand-in)</title></head>
+<body>
+<label><input type="radio" name="tipo"> Opção sobre Ação</label>
+<div id="symbolSelect"><div><input type="text" id="symbol"></div></div>
+<input type="text" id="qtd_buy">
+<div id="divQtdSell"><input type="text" id="qtd_sell"></div>
+<button class="btn" id="add">ADICIONAR</button>
+<button class="btn" id="calc">CALCULAR</button>
+<div><span>Risco das Posições</span><span id="risk">-</span></div>
+<script>
+const state = {symbol: null, buy: 0, sell: 0, positions: []};
+const symbol = document.getElementById('symbol');
+symbol.addEventListener('keydown', e => { if (e.key === 'Enter') state.symbol = symbol.value.trim(); });
+// Like the real app, quantities only register through input/change events
+for (const [id, key] of [['qtd_buy', 'buy'], ['qtd_sell', 'sell']]) {
+    const el = document.getElementById(id);
+    const update = () => { state[key] = parseInt(el.value || '0', 10); };
+    el.addEventListener('input', update);
+    el.addEventListener('change', update);
+}
+document.getElementById('add').addEventListener('click', () => {
+    if (state.symbol) state.positions.push({buy: state.buy, sell: state.sell});
+    state.symbol = null;
+    symbol.value = '';
+});
+document.getElementById('calc').addEventListener('click', () => {
+    const total = state.positions.reduce((acc, p) => acc + p.buy * %(buy)s + p.sell * %(sell)s, 0);
+    const cents = Math.round(total * 100);
+    const reais = Math.floor(cents / 100).toString().replace(/\\B(?=(\\d{3})+(?!\\d))/g, '.');
+    document.getElementById('risk').textContent = 'R$ ' + reais + ',' + String(cents %% 100).padStart(2, '0');
+});
+</script>
+</body></html>
+""" % {"buy": BUY_RATE, "sell": SELL_RATE}
+
+POSITIONS = [
+    {"asset": "PETR4", "quantity": 100, "type": "Compra"},
+    {"asset": "VALE3", "quantity": 300, "type": "Venda"},
+    {"asset": "BBAS3", "quantity": 1200, "type": "Compra"},
+]
+
+
+class FakeElement:
+    text = "R$ 1.234,56"
+
+    def click(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def send_keys(self, *keys):
+        pass
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def find_element(self, by, value):
+        return self
+
+
+class FakeChrome:
+    """Records how the front end launched Chrome; every lookup succeeds immediately"""
+    launches = []
+
+    def __init__(self, service=None, options=None):
+        FakeChrome.launches.append(list(options.arguments))
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def find_element(self, by, value):
+        return FakeElement()
+
+    def execute_script(self, script, *args):
+        pass
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    """Patch Chrome out and record every wait timeout and sleep the engine performs"""
+    FakeChrome.launches = []
+    calls = []
+
+    class RecordingWait(b3_bot.WebDriverWait):
+        def __init__(self, driver, timeout, *args, **kwargs):
+            calls.append(("wait", timeout))
+            super().__init__(driver, timeout, *args, **kwargs)
+
+    monkeypatch.setattr(b3_bot.webdriver, "Chrome", FakeChrome)
+    monkeypatch.setattr(b3_bot, "WebDriverWait", RecordingWait)
+    monkeypatch.setattr(b3_bot, "CHROMEDRIVER_PATH", "/usr/bin/chromedriver")  # Never download
+    monkeypatch.setattr(b3_bot.time, "sleep", lambda seconds: calls.append(("sleep", seconds)))
+    return calls
+
+
+def test_front_ends_share_engine_config(fake_browser):
+    bot_risk, bot_progress, _ = run(B3SimulatorBot(headless=True).process_simulation(POSITIONS))
+    bot_calls = list(fake_browser)
+    fake_browser.clear()
+
+    api_positions = [server.Position(id=str(i), **p) for i, p in enumerate(POSITIONS)]
+    api_risk, api_progress, _ = run(server.process_simulation(api_positions, headless=True))
+    api_calls = list(fake_browser)
+
+    bot_options, api_options = FakeChrome.launches
+    assert api_options == bot_options
+    for flag in ("--headless=new", "--disable-dev-shm-usage", "--disable-background-timer-throttling",
+                 "--disable-renderer-backgrounding", "--disable-background-networking"):
+        assert flag in api_options
+
+    # Same waits (timeouts) and sleeps, in the same order
+    assert api_calls == bot_calls
+    assert ("wait", 15) not in api_calls
+    assert max(seconds for kind, seconds in api_calls if kind == "sleep") <= 1.5
+
+    assert bot_risk == api_risk == 1234.56
+    assert bot_progress == api_progress == len(POSITIONS)
+
+
+@pytest.fixture(scope="module")
+def stand_in_url(tmp_path_factory):
+    chromedriver = os.environ.get("CHROMEDRIVER_PATH") or shutil.which("chromedriver")
+    if not chromedriver:
+        pytest.skip("chromedriver não encontrado: defina CHROMEDRIVER_PATH para rodar contra o Chrome real")
+
+    page = tmp_path_factory.mktemp("simulador") / "index.html"
+    page.write_text(STAND_IN_HTML, encoding="utf-8")
+
+    original = b3_bot.CHROMEDRIVER_PATH
+    b3_bot.CHROMEDRIVER_PATH = chromedriver
+    bot = B3SimulatorBot(headless=True)
+    try:
+        bot.start_driver()
+    except Exception as e:
+        b3_bot.CHROMEDRIVER_PATH = original
+        pytest.skip(f"Chrome indisponível: {e}")
+    finally:
+        bot.close_driver()
+    yield page.as_uri()
+    b3_bot.CHROMEDRIVER_PATH = original
+
+
+def run(events):
+    """Collect risk, progress count and per-position latencies (time between progress events)"""
+    risk = None
+    progress = 0
+    stamps = []
+    for event in events:
+        if event["type"] == "progress":
+            progress += event["value"]
+            stamps.append(time.monotonic())
+        elif event["type"] == "result":
+            risk = event["data"]["risk"]
+    latencies = [b - a for a, b in zip(stamps, stamps[1:])]
+    return risk, progress, latencies
+
+
+def test_front_ends_match(stand_in_url, monkeypatch):
+    monkeypatch.setattr(b3_bot, "SIMULADOR_URL", stand_in_url)
+    expected = sum(p["quantity"] * (BUY_RATE if p["type"] == "Compra" else SELL_RATE) for p in POSITIONS)
+
+    bot_risk, bot_progress, bot_latencies = run(B3SimulatorBot(headless=True).process_simulation(POSITIONS))
+
+    api_positions = [server.Position(id=str(i), **p) for i, p in enumerate(POSITIONS)]
+    api_risk, api_progress, api_latencies = run(server.process_simulation(api_positions, headless=True))
+
+    assert bot_risk == pytest.approx(expected)
+    assert api_risk == pytest.approx(bot_risk)
+    assert bot_progress == api_progress == len(POSITIONS)
+    assert statistics.median(api_latencies) == pytest.approx(statistics.median(bot_latencies), rel=0.25)
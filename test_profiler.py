@@ -0,0 +1,84 @@
+"""RunProfiler summary and Chrome trace export, from hand-built spans (no browser)."""
+import json
+import pytest
+
+from b3_profiler import RunProfiler
+
+
+def span(name, cat, start, end, batch=None, position=None):
+    return {"name": name, "cat": cat, "start": start, "end": end,
+            "batch": batch, "position": position, "args": {}}
+
+
+@pytest.fixture
+def profiler():
+    p = RunProfiler()
+    # Appended in end order, like span() does when the context managers exit
+    p.spans = [
+        span("start_driver", "setup", 0.0, 2.0),
+        span("get", "page_load", 2.0, 4.0, batch=0),
+        span("findElement", "webdriver", 4.0, 4.4, batch=0, position="PETR4"),
+        span("findElement", "webdriver", 4.5, 5.0, batch=0, position="PETR4"),
+        span("element_to_be_clickable", "wait", 4.0, 5.0, batch=0, position="PETR4"),
+        span("clickElement", "webdriver", 5.0, 5.2, batch=0, position="PETR4"),
+        span("sleep", "sleep", 5.2, 5.7, batch=0, position="PETR4"),
+        span("preencher_codigo", "step", 4.0, 6.0, batch=0, position="PETR4"),
+        span("sleep", "sleep", 6.0, 6.5, batch=0, position="PETR4"),
+        span("clicar_adicionar", "step", 6.0, 7.0, batch=0, position="PETR4"),
+        span("PETR4", "position", 4.0, 7.0, batch=0, position="PETR4"),
+        span("get", "page_load", 8.0, 11.0, batch=1),
+        span("sleep", "sleep", 11.0, 12.5, batch=1, position="VALE3"),
+        span("VALE3", "position", 11.0, 12.5, batch=1, position="VALE3"),
+    ]
+    return p
+
+
+def test_operations_do_not_double_count(profiler):
+    summary = profiler.summary(top=20)
+    operations = {row["operation"]: row for row in summary["slowest_operations"]}
+
+    # Polling inside the wait belongs to the wait, not to webdriver:findElement
+    assert "webdriver:findElement" not in operations
+    assert operations["wait:element_to_be_clickable"]["seconds"] == pytest.approx(1.0)
+    assert operations["sleep:sleep"]["count"] == 3
+    assert operations["sleep:sleep"]["seconds"] == pytest.approx(2.5)
+    assert operations["page_load:get"]["seconds"] == pytest.approx(5.0)
+
+    # Operations are disjoint: they add up to no more than the run itself
+    total_ops = sum(row["seconds"] for row in operations.values())
+    assert total_ops == pytest.approx(2.0 + 5.0 + 1.0 + 0.2 + 2.5)
+    assert total_ops <= summary["total_seconds"]
+
+
+def test_steps_and_tickers(profiler):
+    summary = profiler.summary()
+    assert [row["step"] for row in summary["slowest_steps"]] == ["step:preencher_codigo", "step:clicar_adicionar"]
+    assert summary["slowest_tickers"] == [
+        {"ticker": "PETR4", "batch": 1, "seconds": 3.0},
+        {"ticker": "VALE3", "batch": 2, "seconds": 1.5},
+    ]
+    assert summary["total_seconds"] == 12.5
+
+
+def test_chrome_trace_events(profiler):
+    trace = json.loads(profiler.export_chrome_trace())
+    complete = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    metadata = [e for e in trace["traceEvents"] if e["ph"] == "M"]
+
+    assert len(complete) == len(profiler.spans)
+    for event in complete:
+        assert isinstance(event["ts"], int) and isinstance(event["dur"], int)
+        assert event["dur"] >= 0
+        assert event["pid"] == 1
+
+    # One track per batch (tid = batch + 1); spans outside any batch on track 0
+    tids = {(e["name"], e["ts"]): e["tid"] for e in complete}
+    assert tids[("start_driver", 0)] == 0
+    assert tids[("get", 2_000_000)] == 1
+    assert tids[("get", 8_000_000)] == 2
+    assert {e["tid"]: e["args"]["name"] for e in metadata} == {0: "Setup", 1: "Lote 1", 2: "Lote 2"}
+    assert all(e["name"] == "thread_name" for e in metadata)
+
+    click = next(e for e in complete if e["name"] == "clickElement")
+    assert click["args"] == {"batch": 1, "position": "PETR4"}
+    assert click["dur"] == 200_000
@@ -0,0 +1,145 @@
+"""Shared batch queue, worker loop and coordinator; no browser needed (stub bot)."""
+import time
+import threading
+import pytest
+
+from b3_queue import BatchQueue
+from b3_worker import BatchWorker
+from b3_coordinator import process_simulation_distributed
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+def test_expired_lease_is_handed_out_again(queue_path):
+    queue = BatchQueue(queue_path)
+    queue.enqueue_run([[{"asset": "PETR4"}]])
+
+    first = queue.claim("w1", lease_seconds=0.05)
+    assert queue.claim("w2") is None  # Still leased
+    time.sleep(0.1)
+    second = queue.claim("w2")
+    assert second["id"] == first["id"]
+
+
+def test_worker_that_lost_the_lease_is_ignored(queue_path):
+    queue = BatchQueue(queue_path)
+    run_id = queue.enqueue_run([[{"asset": "PETR4"}]])
+    job = queue.claim("w1", lease_seconds=0.05)
+    time.sleep(0.1)
+    queue.claim("w2")
+
+    assert not queue.heartbeat(job["id"], "w1")
+    assert not queue.publish_event(job["id"], "w1", {"type": "progress", "value": 1})
+    assert not queue.complete(job["id"], "w1", {"risk": 1.0, "ok": True})
+    assert queue.complete(job["id"], "w2", {"risk": 2.0, "ok": True})
+    assert queue.read_events(run_id) == []
+    assert queue.run_status(run_id)[0]["result"] == {"risk": 2.0, "ok": True}
+
+
+def test_job_fails_after_max_attempts_via_release(queue_path):
+    queue = BatchQueue(queue_path, max_attempts=2)
+    run_id = queue.enqueue_run([[{"asset": "PETR4"}]])
+    for worker in ("w1", "w2"):
+        job = queue.claim(worker)
+        assert queue.release(job["id"], worker)
+
+    assert queue.claim("w3") is None
+    status = queue.run_status(run_id)[0]
+    assert status["status"] == "failed"
+    assert status["attempts"] == 2
+    assert status["result"] == {"risk": 0.0, "ok": False}
+
+
+def test_job_fails_after_max_attempts_via_expiry(queue_path):
+    queue = BatchQueue(queue_path, max_attempts=2)
+    run_id = queue.enqueue_run([[{"asset": "PETR4"}]])
+    for worker in ("w1", "w2"):
+        assert queue.claim(worker, lease_seconds=0.02) is not None
+        time.sleep(0.05)
+
+    assert queue.fail_expired() == 1
+    assert queue.run_status(run_id)[0]["status"] == "failed"
+
+
+def test_purge_run(queue_path):
+    queue = BatchQueue(queue_path)
+    run_id = queue.enqueue_run([[{"asset": "PETR4"}], [{"asset": "VALE3"}]])
+    job = queue.claim("w1")
+    queue.publish_event(job["id"], "w1", {"type": "progress", "value": 1})
+
+    queue.purge_run(run_id)
+    assert queue.run_status(run_id) == []
+    assert queue.read_events(run_id) == []
+    assert not queue.complete(job["id"], "w1", {"risk": 1.0, "ok": True})
+    assert queue.claim("w1") is None
+
+
+def test_abandoned_run_is_purged_before_newer_runs(queue_path):
+    queue = BatchQueue(queue_path)
+    orphan = queue.enqueue_run([[{"asset": "PETR4"}]], run_ttl=0.05)
+    live = queue.enqueue_run([[{"asset": "VALE3"}]])
+    time.sleep(0.1)
+
+    job = queue.claim("w1")
+    assert job["run_id"] == live
+    assert queue.run_status(orphan) == []
+
+
+def test_touch_run_keeps_run_alive(queue_path):
+    queue = BatchQueue(queue_path)
+    run_id = queue.enqueue_run([[{"asset": "PETR4"}]], run_ttl=0.1)
+    time.sleep(0.06)
+    queue.touch_run(run_id, run_ttl=0.1)
+    time.sleep(0.06)
+    assert queue.claim("w1")["run_id"] == run_id
+
+
+class StubBot:
+    """Stands in for B3SimulatorBot: risk 1.0 per position, batches in crash_batches raise"""
+
+    def __init__(self, crash_batches=()):
+        self.driver = None
+        self.crash_batches = set(crash_batches)
+
+    def start_driver(self):
+        self.driver = object()
+
+    def close_driver(self):
+        self.driver = None
+
+    def process_batch(self, batch, batch_idx, total_batches):
+        if batch_idx in self.crash_batches:
+            raise RuntimeError("chrome crashed")
+        for _ in batch:
+            yield {"type": "progress", "value": 1}
+        return float(len(batch))
+
+
+def test_coordinator_sums_done_batches_and_reports_failed(queue_path):
+    positions = [{"asset": f"ATIVO{i}", "quantity": 100, "type": "Compra"} for i in range(45)]  # Batches of 20, 20, 5
+    worker = BatchWorker(BatchQueue(queue_path, max_attempts=2), StubBot(crash_batches={1}), poll_interval=0.01)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    try:
+        events = list(process_simulation_distributed(positions, queue_path, poll_interval=0.01, idle_timeout=5, max_attempts=2))
+    finally:
+        worker.stop()
+        thread.join()
+
+    result = next(e for e in events if e["type"] == "result")["data"]
+    errors = [e for e in events if e["type"] == "error"]
+    assert result["risk"] == 25.0
+    assert result["failedBatches"] == 1
+    assert [e["batch"] for e in errors] == [2]
+    assert sum(e["value"] for e in events if e["type"] == "progress") == 25
+
+
+def test_coordinator_times_out_without_workers(queue_path):
+    events = list(process_simulation_distributed([{"asset": "PETR4", "quantity": 1, "type": "Compra"}],
+                                                 queue_path, poll_interval=0.01, idle_timeout=0.1))
+    assert events[-1]["type"] == "error"
+    assert "Tempo esgotado" in events[-1]["message"]
+    assert not any(e["type"] == "result" for e in events)
@@ -0,0 +1,115 @@
+"""Event filtering and framing for the /simulate stream (pure functions, no browser)."""
+import gzip
+import json
+import zlib
+import pytest
+
+import b3_stream
+from b3_stream import filter_events, encode_events
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(b3_stream.time, "monotonic", fake)
+    return fake
+
+
+def position_events(clock, count, seconds_each=5.0):
+    """What process_batch yields per position: a debug log, then progress"""
+    for i in range(count):
+        clock.now += seconds_each
+        yield {"type": "log", "message": f"Adicionando: ATIVO{i}", "level": "debug"}
+        yield {"type": "progress", "value": 1}
+
+
+def test_level_filtering(clock):
+    events = [
+        {"type": "log", "message": "d", "level": "debug"},
+        {"type": "log", "message": "i", "level": "info"},
+        {"type": "log", "message": "s", "level": "success"},
+        {"type": "log", "message": "w", "level": "warning"},
+    ]
+    assert [e["message"] for e in filter_events(events, "debug")] == ["d", "i", "s", "w"]
+    assert [e["message"] for e in filter_events(events, "info")] == ["i", "s", "w"]
+    assert [e["message"] for e in filter_events(events, "warning")] == ["w"]
+    assert list(filter_events(events, "error")) == []
+
+
+def test_result_and_errors_always_pass(clock):
+    events = [
+        {"type": "error", "batch": 1, "message": "Erro no lote 1: boom"},
+        {"type": "result", "data": {"risk": 1.0}},
+        {"type": "profile", "data": {}},
+    ]
+    assert list(filter_events(events, "error")) == events
+
+
+def test_legacy_error_form_unless_opted_in(clock):
+    error = {"type": "error", "batch": None, "message": "Erro fatal: boom"}
+    assert list(filter_events([error], "error", structured_errors=False)) == [
+        {"type": "log", "message": "Erro fatal: boom", "level": "error"}
+    ]
+
+
+def test_progress_merged_even_with_debug_logs(clock):
+    # 20 positions at 5s each with a 30s window: debug logs must not flush the window
+    out = list(filter_events(position_events(clock, 20), "debug", progress_window=30))
+    progress = [e["value"] for e in out if e["type"] == "progress"]
+    assert sum(progress) == 20
+    assert len(progress) <= 4
+    assert sum(1 for e in out if e["type"] == "log") == 20
+
+
+def test_progress_frames_flat_as_book_grows_within_window(clock):
+    # At verbosity=info the frame count depends on elapsed time / window, not positions
+    out = list(filter_events(position_events(clock, 100, seconds_each=0.1), "info", progress_window=30))
+    assert out == [{"type": "progress", "value": 100}]
+
+
+def test_pending_progress_flushed_before_result(clock):
+    events = list(position_events(clock, 3)) + [{"type": "result", "data": {"risk": 1.0}}]
+    out = list(filter_events(events, "info", progress_window=30))
+    assert out == [{"type": "progress", "value": 3}, {"type": "result", "data": {"risk": 1.0}}]
+
+
+EVENTS = [
+    {"type": "log", "message": "Simulação finalizada com sucesso.", "level": "success"},
+    {"type": "progress", "value": 3},
+    {"type": "result", "data": {"risk": 1234.56, "date": "19/10/2026 10:00:00"}},
+]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_ndjson_round_trip(compress):
+    raw = b"".join(encode_events(EVENTS, "ndjson", compress))
+    if compress:
+        raw = gzip.decompress(raw)
+    assert [json.loads(line) for line in raw.decode("utf-8").splitlines()] == EVENTS
+
+
+def test_gzip_chunks_decode_incrementally():
+    # Every event is sync-flushed, so a client can decode it before the stream ends
+    chunks = list(encode_events(EVENTS, "ndjson", compress=True))
+    decoder = zlib.decompressobj(31)
+    first = decoder.decompress(chunks[0])
+    assert json.loads(first) == EVENTS[0]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_msgpack_round_trip(compress):
+    msgpack = pytest.importorskip("msgpack")
+    raw = b"".join(encode_events(EVENTS, "msgpack", compress))
+    if compress:
+        raw = gzip.decompress(raw)
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(raw)
+    assert list(unpacker) == EVENTS